@@ -1,56 +1,143 @@
-from flask import Flask, render_template, request, jsonify, session
+from quart import Quart, Request, Response, request
+import asyncio
+import msgspec.json
+import orjson
 import os
+import time
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import logging
-from typing import Optional, Dict, List
-from dataclasses import dataclass
+import logging.handlers
+import queue
 from pathlib import Path
-from ollama_client import OllamaClient  # Import OllamaClient
+from attachment_io import UringWriter
+from chat_store import ChatStore
+from config import Config
+from models import ChatMessage
+from ollama_client import get_ollama_client
+from stats import message_token_stats
 
-# Data structure for chat messages
-@dataclass
-class ChatMessage:
-    content: str
-    timestamp: datetime
-    is_user: bool
-    attachment_path: Optional[str] = None
+def _isoformat(ts: float) -> str:
+    """Format an epoch timestamp as ISO 8601, only when serializing."""
+    return datetime.utcfromtimestamp(ts).isoformat()
+
+def ojson(d: dict, status: int = 200) -> Response:
+    """JSON response encoded with orjson instead of stdlib json."""
+    return Response(orjson.dumps(d), status=status, mimetype='application/json')
+
+# Maps every byte outside [A-Za-z0-9._-] to '_'
+_SAFE_FILENAME_TABLE = bytes(
+    b if (48 <= b <= 57 or 65 <= b <= 90 or 97 <= b <= 122 or b in b'._-')
+    else ord('_')
+    for b in range(256)
+)
+
+def fast_secure_filename(name: str) -> str:
+    """Sanitize an upload filename.
+
+    ASCII names (the overwhelming majority) are scrubbed with a single
+    bytes.translate pass over a precomputed table; anything non-ASCII
+    falls back to werkzeug's secure_filename, which handles unicode
+    normalization.
+    """
+    try:
+        raw = name.encode('ascii')
+    except UnicodeEncodeError:
+        return secure_filename(name)
+    return raw.translate(_SAFE_FILENAME_TABLE).decode('ascii').strip('._')
+
+class ChatRequest(Request):
+    """Request with per-endpoint caps on actually received bytes.
+
+    The cap is chosen from the path before the body arrives, so a
+    chunked request with no Content-Length header is still cut off at
+    the endpoint's limit instead of the app-wide default.
+    """
+
+    def __init__(self, method: str, scheme: str, path: str, *args, **kwargs):
+        kwargs['max_content_length'] = (
+            Config.MAX_CONTENT_LENGTH
+            if path == '/upload_attachment'
+            else Config.MAX_MESSAGE_BYTES
+        )
+        super().__init__(method, scheme, path, *args, **kwargs)
 
 class ChatApp:
+    # Permitted upload suffixes, lowercase (add more as needed)
+    _ALLOWED_SUFFIXES = ('.txt', '.pdf', '.png', '.jpg', '.jpeg', '.gif')
+
     def __init__(self, model_path: str, upload_folder: str):
-        self.app = Flask(__name__)
+        self.app = Quart(__name__)
+        self.app.request_class = ChatRequest
         self.app.config['UPLOAD_FOLDER'] = upload_folder
-        self.app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
         self.app.secret_key = os.urandom(24)  # For session management
-        
-        # Configure logging
-        logging.basicConfig(
-            filename='chat_app.log',
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+        # Configure logging: handlers on the request path only enqueue
+        # the record; a background listener thread does the file writes,
+        # so logging never blocks a handler on disk latency
+        log_queue = queue.SimpleQueue()
+        file_handler = logging.handlers.RotatingFileHandler(
+            'chat_app.log',
+            maxBytes=10 * 1024 * 1024,
+            backupCount=3
+        )
+        file_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        ))
+        root_logger = logging.getLogger()
+        root_logger.setLevel(logging.INFO)
+        root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self._log_listener = logging.handlers.QueueListener(
+            log_queue, file_handler
         )
+        self._log_listener.start()
         self.logger = logging.getLogger(__name__)
-        
+
         # Initialize model
         try:
             self.model = self._initialize_model(model_path)
         except Exception as e:
             self.logger.error(f"Failed to initialize model: {str(e)}")
             raise
-        
-        # Store chat histories in memory (consider using a database for production)
-        self.chat_histories: Dict[str, List[ChatMessage]] = {}
-        
+
+        # Chat histories live in SQLite (WAL) so they are shared across
+        # workers and don't grow process memory over long sessions
+        self.store = ChatStore(Config.DATABASE_PATH)
+
         # Register routes
         self._register_routes()
-        
-        # Create upload folder if it doesn't exist
-        Path(upload_folder).mkdir(parents=True, exist_ok=True)
+
+        # Templates are compiled once: no file-watcher stat per render,
+        # and compiled bytecode persists across restarts
+        env = self.app.jinja_env
+        env.auto_reload = False
+        bytecode_dir = Path('.jinja_cache')
+        bytecode_dir.mkdir(exist_ok=True)
+        env.bytecode_cache = FileSystemBytecodeCache(str(bytecode_dir))
+
+        # Pre-render request-independent templates once at startup and
+        # serve the bytes directly; chat.html depends on the history, so
+        # only its compiled template is cached
+        self._index_html = env.get_template('index.html').render().encode()
+        self._not_found_html = env.get_template('404.html').render().encode()
+        self._server_error_html = env.get_template('500.html').render().encode()
+        self._chat_tpl = env.get_template('chat.html')
+
+        # Create upload folder if it doesn't exist; keep the Path around
+        # so uploads don't rebuild it per request
+        self._upload_root = Path(upload_folder)
+        self._upload_root.mkdir(parents=True, exist_ok=True)
+
+        # io_uring-backed attachment writes on Linux with liburing
+        # installed; otherwise the chunked posix path is used
+        self._uring = UringWriter() if UringWriter.available() else None
 
     def _initialize_model(self, model_path: str):
         """Initialize the Deepseek-R1 model with error handling."""
         try:
-            return OllamaClient(model_path)  # Use OllamaClient
+            return get_ollama_client(model_path)  # Shared per model path
         except Exception as e:
             self.logger.error(f"Model initialization failed: {str(e)}")
             raise RuntimeError(f"Failed to load model: {str(e)}")
@@ -59,155 +146,262 @@ class ChatApp:
         # Main routes
         self.app.route('/')(self.index)
         self.app.route('/chat/<chat_id>')(self.chat)
+        self.app.route('/chat/<chat_id>/history')(self.chat_history)
         self.app.route('/send_message', methods=['POST'])(self.send_message)
         self.app.route('/upload_attachment', methods=['POST'])(self.upload_attachment)
-        
+
         # Error handlers
         self.app.errorhandler(404)(self.page_not_found)
         self.app.errorhandler(500)(self.internal_server_error)
 
-    def index(self):
+    async def index(self):
         """Home page route."""
-        return render_template('index.html')
+        return Response(self._index_html, mimetype='text/html')
 
-    def chat(self, chat_id: str):
+    async def chat(self, chat_id: str):
         """Individual chat page route."""
-        if chat_id not in self.chat_histories:
-            self.chat_histories[chat_id] = []
-        return render_template(
-            'chat.html',
+        html = await self._chat_tpl.render_async(
             chat_id=chat_id,
-            chat_history=self.chat_histories[chat_id]
+            chat_history=self.store.history(chat_id)
         )
+        return Response(html, mimetype='text/html')
 
-    def send_message(self):
+    async def chat_history(self, chat_id: str):
+        """Chat history as JSON, encoded straight from the structs."""
+        return Response(
+            msgspec.json.encode(self.store.history(chat_id)),
+            mimetype='application/json'
+        )
+
+    async def send_message(self):
         """Handle sending messages and getting model responses."""
         try:
-            chat_id = request.form['chat_id']
-            message = request.form['message']
-            
+            # Fast reject on the declared length; ChatRequest also caps
+            # the actually received bytes for chunked requests
+            if (request.content_length or 0) > Config.MAX_MESSAGE_BYTES:
+                return ojson({
+                    'status': 'error',
+                    'message': 'Request body too large'
+                }, 413)
+
+            form = await request.form
+            chat_id = form['chat_id']
+            message = form['message']
+
             if not message.strip():
-                return jsonify({
+                return ojson({
                     'status': 'error',
                     'message': 'Empty message'
-                }), 400
+                }, 400)
 
-            # Create user message
+            # Create user message; time.time() avoids a datetime
+            # allocation and tz lookup per call in the hot path
             user_message = ChatMessage(
                 content=message,
-                timestamp=datetime.now(),
+                timestamp=time.time(),
                 is_user=True
             )
-            
-            # Generate model response
-            try:
-                response = self.model.generate_response(message)
-                model_message = ChatMessage(
-                    content=response,
-                    timestamp=datetime.now(),
-                    is_user=False
-                )
-            except Exception as e:
-                self.logger.error(f"Model response generation failed: {str(e)}")
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Failed to generate response'
-                }), 500
 
-            # Store messages in chat history
-            if chat_id not in self.chat_histories:
-                self.chat_histories[chat_id] = []
-            self.chat_histories[chat_id].extend([user_message, model_message])
+            # Non-streaming fallback: full reply as JSON via the batching layer
+            if form.get('stream') == '0':
+                try:
+                    response = await self.model.submit(message)
+                    model_message = ChatMessage(
+                        content=response,
+                        timestamp=time.time(),
+                        is_user=False
+                    )
+                except Exception as e:
+                    self.logger.error(f"Model response generation failed: {str(e)}")
+                    return ojson({
+                        'status': 'error',
+                        'message': 'Failed to generate response'
+                    }, 500)
 
-            return jsonify({
-                'status': 'success',
-                'response': response,
-                'timestamp': model_message.timestamp.isoformat()
-            })
+                self._store_messages(chat_id, user_message, model_message)
+                return ojson({
+                    'status': 'success',
+                    'response': response,
+                    'timestamp': _isoformat(model_message.timestamp)
+                })
+
+            # Default: stream tokens as SSE so the client sees the first
+            # token at time-to-first-token instead of after full decode.
+            # Quart's RESPONSE_TIMEOUT (60 s) would silently cut the
+            # stream mid-decode, so disable it for this response.
+            response = Response(
+                self._stream_reply(chat_id, message, user_message),
+                mimetype='text/event-stream'
+            )
+            response.timeout = None
+            return response
 
+        except RequestEntityTooLarge:
+            return ojson({
+                'status': 'error',
+                'message': 'Request body too large'
+            }, 413)
         except Exception as e:
             self.logger.error(f"Message handling failed: {str(e)}")
-            return jsonify({
+            return ojson({
                 'status': 'error',
                 'message': 'Internal server error'
-            }), 500
+            }, 500)
+
+    async def _stream_reply(self, chat_id: str, message: str,
+                            user_message: ChatMessage):
+        """Stream the model reply as SSE frames, storing history on close."""
+        chunks = []
+        try:
+            async for chunk in self.model.stream_response(message):
+                chunks.append(chunk)
+                yield b'data: ' + orjson.dumps({'token': chunk}) + b'\n\n'
+        except Exception as e:
+            self.logger.error(f"Model response generation failed: {str(e)}")
+            yield b'event: error\ndata: {"message": "Failed to generate response"}\n\n'
+            return
+
+        model_message = ChatMessage(
+            content=''.join(chunks),
+            timestamp=time.time(),
+            is_user=False
+        )
+        self._store_messages(chat_id, user_message, model_message)
+        yield (
+            b'event: done\ndata: '
+            + orjson.dumps({'timestamp': _isoformat(model_message.timestamp)})
+            + b'\n\n'
+        )
+
+    def _store_messages(self, chat_id: str, *messages: ChatMessage):
+        """Append messages to the chat history."""
+        self.store.append(chat_id, *messages)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            for m in messages:
+                total, unique = message_token_stats(m.content)
+                self.logger.debug(
+                    f"chat {chat_id}: {total} tokens ({unique} unique), "
+                    f"is_user={m.is_user}"
+                )
 
-    def upload_attachment(self):
+    async def upload_attachment(self):
         """Handle file uploads with security checks."""
         try:
-            if 'file' not in request.files:
-                return jsonify({
+            if (request.content_length or 0) > Config.MAX_CONTENT_LENGTH:
+                return ojson({
+                    'status': 'error',
+                    'message': 'File too large'
+                }, 413)
+
+            files = await request.files
+            if 'file' not in files:
+                return ojson({
                     'status': 'error',
                     'message': 'No file part'
-                }), 400
+                }, 400)
 
-            file = request.files['file']
+            file = files['file']
             if not file.filename:
-                return jsonify({
+                return ojson({
                     'status': 'error',
                     'message': 'No selected file'
-                }), 400
+                }, 400)
 
-            # Validate file type (add more as needed)
-            allowed_extensions = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif'}
-            if not self._allowed_file(file.filename, allowed_extensions):
-                return jsonify({
+            # Validate file type
+            if not self._allowed_file(file.filename):
+                return ojson({
                     'status': 'error',
                     'message': 'File type not allowed'
-                }), 400
+                }, 400)
+
+            filename = fast_secure_filename(file.filename)
+            file_path = self._upload_root / filename
 
-            filename = secure_filename(file.filename)
-            file_path = Path(self.app.config['UPLOAD_FOLDER']) / filename
-            
-            # Save file with error handling
+            # Save file with error handling (off the event loop)
             try:
-                file.save(file_path)
+                if self._uring is not None:
+                    await asyncio.wrap_future(
+                        self._uring.save(file_path, file.stream)
+                    )
+                else:
+                    await asyncio.to_thread(self._save_upload, file, file_path)
             except Exception as e:
                 self.logger.error(f"File save failed: {str(e)}")
-                return jsonify({
+                return ojson({
                     'status': 'error',
                     'message': 'Failed to save file'
-                }), 500
+                }, 500)
 
-            return jsonify({
+            return ojson({
                 'status': 'success',
                 'filename': filename,
                 'path': str(file_path)
             })
 
+        except RequestEntityTooLarge:
+            return ojson({
+                'status': 'error',
+                'message': 'File too large'
+            }, 413)
         except Exception as e:
             self.logger.error(f"File upload failed: {str(e)}")
-            return jsonify({
+            return ojson({
                 'status': 'error',
                 'message': 'Internal server error'
-            }), 500
+            }, 500)
 
     @staticmethod
-    def _allowed_file(filename: str, allowed_extensions: set) -> bool:
-        """Check if file extension is allowed."""
-        return '.' in filename and \
-            filename.rsplit('.', 1)[1].lower() in allowed_extensions
+    def _save_upload(file, file_path: Path):
+        """Copy an upload to disk in 64 KB chunks.
 
-    def page_not_found(self, e):
+        Avoids file.save's read-everything-then-copy behaviour: bytes
+        move straight from the request spool to an unbuffered file
+        handle, one chunk at a time.
+        """
+        stream = file.stream
+        stream.seek(0)
+        with open(file_path, 'wb', buffering=0) as f:
+            while chunk := stream.read(65536):
+                f.write(chunk)
+
+    @classmethod
+    def _allowed_file(cls, filename: str) -> bool:
+        """Check if file extension is allowed.
+
+        str.endswith against the precomputed suffix tuple avoids the
+        rsplit list, substring and set build of the previous version.
+        """
+        return filename.lower().endswith(cls._ALLOWED_SUFFIXES)
+
+    async def page_not_found(self, e):
         """404 error handler."""
-        return render_template('404.html'), 404
+        return Response(self._not_found_html, status=404, mimetype='text/html')
 
-    def internal_server_error(self, e):
+    async def internal_server_error(self, e):
         """500 error handler."""
-        return render_template('500.html'), 500
+        return Response(self._server_error_html, status=500, mimetype='text/html')
 
     def run(self, **kwargs):
-        """Run the Flask application."""
+        """Run the Quart application.
+
+        For production, serve the create_app factory with hypercorn:
+            hypercorn 'app:create_app()' --workers 4 --worker-class uvloop
+        """
         self.app.run(**kwargs)
 
+def create_app() -> Quart:
+    """App factory for ASGI servers, configured from Config."""
+    return ChatApp(Config.MODEL_PATH, Config.UPLOAD_FOLDER).app
+
 if __name__ == '__main__':
     # Configuration
     MODEL_PATH = r"C:\Users\Abhishek\.ollama\models\manifests\registry.ollama.ai\library\deepseek-r1\7b"
     UPLOAD_FOLDER = Path('uploads')
-    
-    # Initialize and run application
+
+    # Initialize and run application; debug (reloader, debugger PIN,
+    # template auto-reload) is opt-in via DEBUG=1
     try:
         chat_app = ChatApp(MODEL_PATH, str(UPLOAD_FOLDER))
-        chat_app.run(debug=True)
+        chat_app.run(debug=os.getenv('DEBUG') == '1')
     except Exception as e:
-        print(f"Failed to start application: {str(e)}")
\ No newline at end of file
+        print(f"Failed to start application: {str(e)}")
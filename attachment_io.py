@@ -0,0 +1,132 @@
+import logging
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+
+try:
+    import liburing
+except ImportError:  # optional; posix fallback is used without it
+    liburing = None
+
+_CHUNK_SIZE = 65536
+_BATCH_SIZE = 32  # SQEs submitted per io_uring_submit
+
+class UringWriter:
+    """Batched io_uring file writer for attachment uploads.
+
+    Write ops are enqueued as (path, stream, future) and drained by a
+    daemon thread that submits up to _BATCH_SIZE write SQEs per
+    io_uring_submit, then reaps the matching CQEs. Batching the
+    submissions amortizes the syscall cost across concurrent uploads
+    instead of serializing one blocking write() at a time.
+    """
+
+    @staticmethod
+    def available() -> bool:
+        """Whether the io_uring backend can be used on this host."""
+        return liburing is not None and sys.platform.startswith('linux')
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._ops: queue.SimpleQueue = queue.SimpleQueue()
+        self._ring = liburing.io_uring()
+        liburing.io_uring_queue_init(_BATCH_SIZE * 2, self._ring)
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def save(self, file_path, stream) -> Future:
+        """Enqueue a write of stream's contents to file_path.
+
+        Returns a future resolved (with the byte count) once every CQE
+        for the file has completed.
+        """
+        future: Future = Future()
+        self._ops.put((file_path, stream, future))
+        return future
+
+    def _drain(self):
+        while True:
+            file_path, stream, future = self._ops.get()
+            try:
+                future.set_result(self._write_file(file_path, stream))
+            except Exception as e:
+                self.logger.error(f"io_uring write failed: {str(e)}")
+                future.set_exception(e)
+
+    def _write_file(self, file_path, stream) -> int:
+        """Write one upload through the ring in batched SQEs."""
+        stream.seek(0)
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        written = 0
+        expected = 0
+        try:
+            while True:
+                # Build a batch of chunk writes, then submit them together
+                batch = []
+                offset = expected
+                while len(batch) < _BATCH_SIZE:
+                    chunk = stream.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    batch.append((chunk, offset))
+                    offset += len(chunk)
+                if not batch:
+                    break
+                expected = offset
+
+                # Tag each SQE with its batch index so a completion can
+                # be matched back to the chunk it wrote
+                for i, (chunk, chunk_offset) in enumerate(batch):
+                    sqe = liburing.io_uring_get_sqe(self._ring)
+                    liburing.io_uring_prep_write(
+                        sqe, fd, chunk, len(chunk), chunk_offset
+                    )
+                    sqe.user_data = i
+                liburing.io_uring_submit(self._ring)
+
+                cqe = liburing.io_uring_cqe()
+                shorts = []
+                for _ in batch:
+                    liburing.io_uring_wait_cqe(self._ring, cqe)
+                    res = cqe.res
+                    index = cqe.user_data
+                    liburing.io_uring_cqe_seen(self._ring, cqe)
+                    if res < 0:
+                        raise OSError(-res, os.strerror(-res))
+                    written += res
+                    chunk, chunk_offset = batch[index]
+                    if res < len(chunk):
+                        shorts.append((chunk[res:], chunk_offset + res))
+
+                # Short writes would leave holes in the file; resubmit
+                # the remainders once the ring is drained, one SQE at a
+                # time so each completion is unambiguous
+                for chunk, chunk_offset in shorts:
+                    while chunk:
+                        res = self._write_remainder(fd, chunk, chunk_offset)
+                        written += res
+                        chunk = chunk[res:]
+                        chunk_offset += res
+
+            if written != expected:
+                raise OSError(
+                    f"short upload write: {written} of {expected} bytes"
+                )
+        finally:
+            os.close(fd)
+        return written
+
+    def _write_remainder(self, fd: int, chunk, offset: int) -> int:
+        """Submit a single write SQE and return its completed byte count."""
+        sqe = liburing.io_uring_get_sqe(self._ring)
+        liburing.io_uring_prep_write(sqe, fd, chunk, len(chunk), offset)
+        liburing.io_uring_submit(self._ring)
+        cqe = liburing.io_uring_cqe()
+        liburing.io_uring_wait_cqe(self._ring, cqe)
+        res = cqe.res
+        liburing.io_uring_cqe_seen(self._ring, cqe)
+        if res < 0:
+            raise OSError(-res, os.strerror(-res))
+        return res
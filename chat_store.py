@@ -0,0 +1,78 @@
+import logging
+import sqlite3
+import threading
+from typing import List
+
+from config import Config
+from models import ChatMessage
+
+class ChatStore:
+    """SQLite-backed chat history storage.
+
+    Uses WAL journaling so appends are O(1) and readers never block
+    writers; histories no longer grow process memory and survive
+    restarts, unlike the previous per-process dict.
+    """
+
+    def __init__(self, db_path: str):
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS messages ('
+            'chat_id TEXT, ts REAL, is_user INT, content TEXT, attach TEXT)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_messages_chat_ts '
+            'ON messages (chat_id, ts)'
+        )
+        self._conn.commit()
+
+    def append(self, chat_id: str, *messages: ChatMessage):
+        """Append messages to a chat history with a single insert."""
+        with self._lock:
+            self._conn.executemany(
+                'INSERT INTO messages VALUES (?, ?, ?, ?, ?)',
+                [
+                    (
+                        chat_id,
+                        m.timestamp,
+                        int(m.is_user),
+                        m.content,
+                        m.attachment_path
+                    )
+                    for m in messages
+                ]
+            )
+            self._conn.commit()
+
+    def history(self, chat_id: str) -> List[ChatMessage]:
+        """Return a chat's most recent messages in chronological order.
+
+        Bounded at Config.MAX_HISTORY so one very long chat can't blow
+        up render time or memory.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT ts, is_user, content, attach FROM ('
+                'SELECT ts, is_user, content, attach FROM messages '
+                'WHERE chat_id = ? ORDER BY ts DESC LIMIT ?'
+                ') ORDER BY ts',
+                (chat_id, Config.MAX_HISTORY)
+            ).fetchall()
+        return [
+            ChatMessage(
+                content=content,
+                timestamp=ts,
+                is_user=bool(is_user),
+                attachment_path=attach
+            )
+            for ts, is_user, content, attach in rows
+        ]
+
+    def close(self):
+        """Close the underlying connection."""
+        with self._lock:
+            self._conn.close()
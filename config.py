@@ -4,5 +4,14 @@ from pathlib import Path
 class Config:
     MODEL_PATH = r"C:\Users\Abhishek\.ollama\models\manifests\registry.ollama.ai\library\deepseek-r1\7b"
     UPLOAD_FOLDER = str(Path('uploads'))
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    DATABASE_PATH = str(Path('chat_history.db'))
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size (uploads only)
+    MAX_MESSAGE_BYTES = 64 * 1024  # 64KB max body for text-only endpoints
     SECRET_KEY = os.urandom(24)
+    MAX_BATCH = 8  # Max prompts dispatched to the model per batch
+    BATCH_WINDOW_MS = 8  # How long to wait for more prompts before dispatching
+    RESPONSE_CACHE_SIZE = 4096  # Max cached prompt -> reply entries
+    MAX_HISTORY = 512  # Max messages loaded per chat
+    # Speculative decoding: draft tokens accepted per forward pass.
+    # Requires an Ollama build with draft-model support; 0 disables.
+    NUM_DRAFT = int(os.getenv('NUM_DRAFT', '0'))
@@ -1,10 +1,15 @@
-from dataclasses import dataclass
-from datetime import datetime
 from typing import Optional
 
-@dataclass
-class ChatMessage:
+import msgspec
+
+class ChatMessage(msgspec.Struct, frozen=True):
+    """A single chat message.
+
+    msgspec.Struct keeps the slotted, frozen layout of the previous
+    dataclass and encodes straight to JSON bytes with no intermediate
+    dict (msgspec.json.encode).
+    """
     content: str
-    timestamp: datetime
+    timestamp: float  # Unix epoch seconds (time.time())
     is_user: bool
     attachment_path: Optional[str] = None
@@ -0,0 +1,37 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to the numpy path
+    njit = None
+
+def _token_stats(ids: np.ndarray):
+    """Aggregate a token-id array: count and unique count."""
+    return ids.shape[0], np.unique(ids).shape[0]
+
+if njit is not None:
+    # JIT-compiled per-token loop; cache=True skips warm-up on reload
+    @njit(cache=True)
+    def _token_stats(ids: np.ndarray):  # noqa: F811
+        n = ids.shape[0]
+        seen = set()
+        for i in range(n):
+            seen.add(ids[i])
+        return n, len(seen)
+
+def message_token_stats(text: str):
+    """Whitespace-token count and unique-token count for a message.
+
+    Tokens are hashed into an np.int32 array so the aggregation runs as
+    a numeric kernel (numba when available, numpy otherwise) instead of
+    a Python-object loop.
+    """
+    # The split + hash below is Python-level work that numba cannot jit
+    # (string hashing) and dominates for a single message; the kernel
+    # only pays off for callers that already hold token-id arrays and
+    # call _token_stats on them directly.
+    ids = np.array(
+        [hash(tok) & 0x7FFFFFFF for tok in text.split()],
+        dtype=np.int32
+    )
+    return _token_stats(ids)